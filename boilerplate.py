@@ -7,7 +7,15 @@ from functools import partialmethod
 from traceback import print_exception
 
 import pygame as pg
-pg.init()
+
+from bundle import Bundle
+
+# Only the subsystems the app uses; audio and joystick init are slow.
+pg.display.init()
+pg.font.init()
+# Pre-decoded texture bundle, used by frozen builds in place of textures/.
+BUNDLE_PATH = 'textures.bundle'
+_bundle = None
 
 
 def dcos(angle):
@@ -37,6 +45,14 @@ def get_sin(p1, p2):
 
 def load_image (name, alpha=None, colorkey=None):
     """Load an image file into memory. Try not to keep too many of these in memory."""
+    global _bundle
+    if _bundle is None and os.path.exists(BUNDLE_PATH):
+        _bundle = Bundle(BUNDLE_PATH)
+    image = _bundle.load(name, alpha is not None) if _bundle else None
+    if image is not None:
+        if colorkey is not None:
+            image.set_colorkey(colorkey)
+        return image
     try:
         image = pg.image.load(os.path.join('textures', name))
     except pg.error:
@@ -0,0 +1,151 @@
+"""Bulk blood color generation on an executor thread, streamed back to the UI."""
+
+import time
+import threading
+from collections import deque
+
+import numpy as np
+
+from colorarray import to_rgb_array
+from sampling import quasi_hsv, random_hsv
+
+
+class BulkJob:
+    """Generates many colors off the event thread and queues them for the UI.
+
+    Colors are drawn a vectorized chunk at a time, then filtered so every
+    color is unique, at least min_sep apart in rgb from the others and, if a
+    registry is given, not issued before. The UI takes a few off the queue
+    each frame, claiming them in the registry as it does, so colors still
+    queued when a job is dropped are never issued. Cancelling stops the
+    worker after its current chunk.
+    """
+
+    CHUNK = 256
+    # Chunks in a row that may yield nothing before the envelope is deemed full.
+    MAX_EMPTY = 64
+
+    def __init__(self, loop, count, hues, **kwargs):
+        self.count = count
+        self.hues = hues
+        self.caste = kwargs.get('caste')
+        self.mutant = kwargs.get('mutant', False)
+        self.min_sep = kwargs.get('min_sep', 0.)
+        self.registry = kwargs.get('registry')
+        # Quasi-random jobs walk the Halton sequence from index up to stop,
+        # others use rng.
+        self.index = kwargs.get('quasi_start')
+        self.stop = kwargs.get('quasi_stop')
+        # Generation mode the colors are stored under.
+        self.mode = kwargs.get('mode')
+        # Seed of the job's generator, stored along with its colors.
+        self.seed = kwargs.get('seed')
+        self.rng = np.random.default_rng(self.seed)
+        self.generated = 0
+        self.received = 0
+        self.queue = deque()
+        self._cancel = threading.Event()
+        self.future = loop.run_in_executor(kwargs.get('executor'), self._run)
+
+    @property
+    def running(self):
+        return not self.future.done()
+
+    @property
+    def finished(self):
+        """Whether the worker stopped and everything it made was taken."""
+        return self.future.done() and not self.queue
+
+    @property
+    def cancelled(self):
+        return self._cancel.is_set()
+
+    def cancel(self):
+        self._cancel.set()
+
+    def take(self, limit):
+        """Return up to limit generated (0xRRGGBB, caste) pairs.
+
+        With a registry, colors are claimed here, and ones that were claimed
+        elsewhere since they were generated are left out.
+        """
+        batch = [self.queue.popleft() for _ in range(min(limit, len(self.queue)))]
+        if self.registry is not None:
+            batch = [color for color in batch if self.registry.claim(color[0])]
+        self.received += len(batch)
+        return batch
+
+    def _draw(self):
+        """Draw a chunk of candidate colors as caste and rgb arrays.
+
+        Returns None once a quasi-random job has used up its index range.
+        """
+        if self.index is not None:
+            stop = self.index + self.CHUNK
+            if self.stop is not None:
+                if self.index >= self.stop:
+                    return None
+                stop = min(stop, self.stop)
+            castes, hue, sat, val = quasi_hsv(
+                self.hues, self.index, stop, self.caste, self.mutant,
+                )
+            self.index = stop
+        else:
+            castes, hue, sat, val = random_hsv(
+                self.rng, self.hues, self.CHUNK, self.caste, self.mutant,
+                )
+        return castes, to_rgb_array(hue, sat, val)
+
+    def _run(self):
+        """Worker loop, run on the executor."""
+        kept = np.empty((0, 3), np.float32)
+        seen = set()
+        min_sq = self.min_sep ** 2
+        empty = 0
+        while self.generated < self.count and not self._cancel.is_set():
+            drawn = self._draw()
+            if drawn is None:
+                break
+            castes, rgb = drawn
+            cand = rgb.astype(np.float32)
+            if min_sq:
+                # Squared distances as |a|^2 + |b|^2 - 2ab, so BLAS does the work.
+                sq = (cand ** 2).sum(axis=1)
+                close = sq[:, None] + sq - 2 * cand @ cand.T < min_sq
+                far = np.ones(len(cand), bool)
+                if len(kept):
+                    # Drop candidates too close to anything kept in earlier chunks.
+                    kept_sq = (kept ** 2).sum(axis=1)
+                    dist = sq[:, None] + kept_sq - 2 * cand @ kept.T
+                    far = dist.min(axis=1) >= min_sq
+                cand_idx = np.nonzero(far)[0]
+            else:
+                cand_idx = range(len(cand))
+            batch = []
+            for i in cand_idx:
+                if self.generated + len(batch) >= self.count:
+                    break
+                r, g, b = rgb[i].tolist()
+                code = (r*256 + g)*256 + b
+                if code in seen:
+                    continue
+                # Candidates must also keep apart from each other.
+                if min_sq and batch and close[i, [j for j, _ in batch]].any():
+                    continue
+                if self.registry is not None and code in self.registry:
+                    continue
+                seen.add(code)
+                batch.append((i, (code, int(castes[i]))))
+            if batch:
+                empty = 0
+                if min_sq:
+                    kept = np.concatenate([kept, cand[[j for j, _ in batch]]])
+                self.queue.extend(color for _, color in batch)
+                self.generated += len(batch)
+            else:
+                empty += 1
+                if empty >= self.MAX_EMPTY:
+                    break
+            # Hand the interpreter back to the event thread between chunks.
+            time.sleep(0)
+        return self.generated
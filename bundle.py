@@ -0,0 +1,121 @@
+#!/usr/bin/env python
+"""Packs textures into a single pre-decoded file that is memory-mapped at launch.
+
+Each texture is stored as raw pixel data in the display's pixel format, so
+loading one is a buffer copy instead of a png decode. If the format the bundle
+was packed in doesn't match the running display, surfaces are converted on load.
+"""
+
+import os
+import sys
+import mmap
+import struct
+
+import pygame as pg
+
+MAGIC = b'HEMO'
+VERSION = 1
+HEADER = struct.Struct('<4sHH')
+# Name length, offset, length, width, height, pitch, bitsize, flags and masks.
+ENTRY = struct.Struct('<HQQHHIBxIIIII')
+ALIGN = 16
+# Textures the app loads, which are all a bundle needs by default.
+TEXTURES = ('buttons.png', 'gamzee.png', 'panel.png')
+
+
+def pack(dirname, path, names=None, alpha=()):
+    """Pack the named pngs in a directory, or all of them, into a bundle at path.
+
+    Textures named in alpha are stored with per-pixel alpha, the rest are
+    stored opaque, matching what load_image does with them.
+    """
+    if not pg.display.get_surface():
+        pg.display.set_mode((1, 1), pg.HIDDEN)
+    if names is None:
+        names = sorted(name for name in os.listdir(dirname) if name.endswith('.png'))
+    surfs = []
+    for name in names:
+        image = pg.image.load(os.path.join(dirname, name))
+        surfs.append(image.convert_alpha() if name in alpha else image.convert())
+    # Lay the data out after the index, aligned for faster copies.
+    index_size = HEADER.size + sum(
+        ENTRY.size + len(name.encode()) for name in names
+        )
+    offset = -index_size % ALIGN + index_size
+    entries = []
+    for name, surf in zip(names, surfs):
+        length = surf.get_pitch() * surf.get_height()
+        entries.append((name, offset, length, surf))
+        offset += -length % ALIGN + length
+    with open(path, 'wb') as file:
+        file.write(HEADER.pack(MAGIC, VERSION, len(entries)))
+        for name, offset, length, surf in entries:
+            encoded = name.encode()
+            file.write(ENTRY.pack(
+                len(encoded), offset, length,
+                surf.get_width(), surf.get_height(), surf.get_pitch(),
+                surf.get_bitsize(), surf.get_flags() & pg.SRCALPHA,
+                *surf.get_masks(),
+                ))
+            file.write(encoded)
+        for name, offset, length, surf in entries:
+            file.seek(offset)
+            file.write(surf.get_buffer().raw)
+    return names
+
+
+class Bundle:
+    """Read-only view of a packed texture bundle."""
+
+    def __init__(self, path):
+        with open(path, 'rb') as file:
+            self.data = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, version, count = HEADER.unpack_from(self.data)
+        if magic != MAGIC or version != VERSION:
+            raise ValueError('{} is not a version {} bundle'.format(path, VERSION))
+        self.entries = {}
+        pos = HEADER.size
+        for _ in range(count):
+            entry = ENTRY.unpack_from(self.data, pos)
+            pos += ENTRY.size
+            name = self.data[pos:pos + entry[0]].decode()
+            pos += entry[0]
+            self.entries[name] = entry[1:]
+
+    def __contains__(self, name):
+        return name in self.entries
+
+    def load(self, name, alpha=False):
+        """Return the named texture as a display-ready surface.
+
+        Returns None if the texture isn't in the bundle or wasn't packed
+        with the requested alpha mode.
+        """
+        try:
+            offset, length, w, h, pitch, bitsize, flags, *masks = self.entries[name]
+        except KeyError:
+            return None
+        if bool(flags) != bool(alpha):
+            return None
+        surf = pg.Surface((w, h), flags, bitsize, masks)
+        if surf.get_pitch() != pitch:
+            return None
+        surf.get_buffer().write(self.data[offset:offset + length])
+        # Convert if the display changed format since the bundle was packed.
+        display = pg.display.get_surface()
+        if alpha:
+            return surf
+        elif display and (display.get_bitsize(), display.get_masks()) != (bitsize, tuple(masks)):
+            return surf.convert()
+        return surf
+
+    def close(self):
+        self.data.close()
+
+
+if __name__ == '__main__':
+    pg.display.init()
+    print('\n'.join(pack(
+        *(sys.argv[1:3] or ('textures', 'textures.bundle')),
+        names=sys.argv[3:] or TEXTURES,
+        )))
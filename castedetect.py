@@ -0,0 +1,167 @@
+#!/usr/bin/env python
+"""Finds the dominant colors of reference art and guesses the troll's caste.
+
+usage: castedetect.py IMAGE [IMAGE ...]
+"""
+
+import sys
+from math import exp
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import pygame as pg
+
+from colorop import to_hsv
+from hemospectrum import COLORS, HUES, CASTES
+
+# Images are downsampled to about this many pixels before clustering.
+MAX_PIXELS = 1 << 16
+# Dominant colors duller or darker than this are skin, outlines or background.
+MIN_SAT = 0.3
+MIN_VAL = 0.15
+# How quickly a color's vote for a caste falls off with distance from it.
+SPREAD = 0.25
+
+
+def load_pixels(path, max_pixels=MAX_PIXELS):
+    """Load an image as an (n, 3) array of its foreground pixels, downsampled.
+
+    Transparent pixels are dropped, as is a flat background color shared by
+    all four corners, like the colorkeys of the sprites in textures/.
+    """
+    image = pg.image.load(path)
+    w, h = image.get_size()
+    corners = {tuple(image.get_at(pos)) for pos in ((0, 0), (w-1, 0), (0, h-1), (w-1, h-1))}
+    scale = min(1., (max_pixels / (w*h)) ** 0.5)
+    if scale < 1:
+        # Nearest-neighbour sampling, so no blended edge colors are made up.
+        image = pg.transform.scale(
+            image, (max(1, int(w*scale)), max(1, int(h*scale)))
+            )
+    if image.get_bitsize() < 24:
+        # surfarray needs 24 or 32 bit surfaces.
+        flat = pg.Surface(image.get_size(), image.get_flags() & pg.SRCALPHA, 32)
+        flat.blit(image, (0, 0))
+        image = flat
+    pixels = pg.surfarray.array3d(image).reshape(-1, 3)
+    if image.get_flags() & pg.SRCALPHA:
+        pixels = pixels[pg.surfarray.array_alpha(image).reshape(-1) > 127]
+    if len(corners) == 1:
+        background = np.array(corners.pop()[:3], dtype=np.uint8)
+        pixels = pixels[(pixels != background).any(axis=1)]
+    return pixels
+
+
+def kmeans(pixels, k=8, iters=12, seed=0):
+    """Cluster pixels into k colors, returning the centers and their pixel counts."""
+    pixels = pixels.astype(np.float32)
+    k = min(k, len(pixels))
+    rng = np.random.default_rng(seed)
+    # k-means++ seeding, so small but distinct regions get a center.
+    centers = [pixels[rng.integers(len(pixels))]]
+    dist = ((pixels - centers[0]) ** 2).sum(axis=1)
+    for _ in range(k - 1):
+        total = dist.sum()
+        if not total:
+            break
+        centers.append(pixels[rng.choice(len(pixels), p=dist / total)])
+        dist = np.minimum(dist, ((pixels - centers[-1]) ** 2).sum(axis=1))
+    centers = np.array(centers)
+    sqnorms = (pixels ** 2).sum(axis=1)[:, None]
+    for _ in range(iters):
+        labels = np.argmin(
+            sqnorms - 2 * pixels @ centers.T + (centers ** 2).sum(axis=1),
+            axis=1,
+            )
+        counts = np.bincount(labels, minlength=len(centers))
+        sums = np.stack(
+            [np.bincount(labels, pixels[:, c], len(centers)) for c in range(3)],
+            axis=1,
+            )
+        moved = np.where(counts[:, None] > 0, sums / np.maximum(counts, 1)[:, None], centers)
+        if np.allclose(moved, centers, atol=0.5):
+            centers = moved
+            break
+        centers = moved
+    order = np.argsort(-counts)
+    return centers[order].round().astype(np.uint8), counts[order]
+
+
+def dominant_colors(path, k=8, max_pixels=MAX_PIXELS):
+    """Return the dominant colors of an image as (rgb tuple, fraction) pairs."""
+    pixels = load_pixels(path, max_pixels)
+    if not len(pixels):
+        return []
+    centers, counts = kmeans(pixels, k)
+    return [
+        (tuple(int(c) for c in center), count / len(pixels))
+        for center, count in zip(centers, counts) if count
+        ]
+
+
+def hue_dist(a, b):
+    """Distance in degrees between two hues around the color wheel."""
+    return min(abs(a - b), 360 - abs(a - b))
+
+
+def match_caste(colors):
+    """Score each caste by how much of the given saturated colors fall near it.
+
+    Colors are compared to the hemospectrum reference mostly by hue, taking
+    the closer of the reference color's hue and the hue colors of that caste
+    are generated around. Saturation and value break ties between castes of
+    similar hue. Each color votes for every caste, less the further it is, so
+    a sprite's highlights and shadows don't outvote its main blood color.
+    Returns the index of the best caste and every caste's score.
+    """
+    refs = [to_hsv(color) for color in COLORS]
+    scores = [0.] * len(refs)
+    for color, weight in colors:
+        hue, sat, val = to_hsv(color)
+        if sat < MIN_SAT or val < MIN_VAL:
+            continue
+        dists = [
+            min(hue_dist(hue, ref_hue), hue_dist(hue, base_hue)) / 30
+            + abs(sat - ref_sat) / 2 + abs(val - ref_val) / 2
+            for (ref_hue, ref_sat, ref_val), base_hue in zip(refs, HUES)
+            ]
+        for idx, dist in enumerate(dists):
+            scores[idx] += weight * exp(-dist / SPREAD)
+    if not any(scores):
+        return None, scores
+    return scores.index(max(scores)), scores
+
+
+def detect(path, k=8, max_pixels=MAX_PIXELS):
+    """Return the dominant colors of an image and its most likely caste index."""
+    colors = dominant_colors(path, k, max_pixels)
+    caste, _ = match_caste(colors)
+    return colors, caste
+
+
+def detect_all(paths, workers=4, **kwargs):
+    """Detect castes of many images in parallel, yielding results in order.
+
+    At most one full-size image is decoded per worker at a time, so peak
+    memory is bounded by the worker count rather than the batch size.
+    """
+    with ThreadPoolExecutor(workers) as pool:
+        yield from pool.map(lambda path: detect(path, **kwargs), paths)
+
+
+def main(argv):
+    if len(argv) < 2:
+        print(__doc__)
+        return 2
+    for path, (colors, caste) in zip(argv[1:], detect_all(argv[1:])):
+        name = CASTES[caste] if caste is not None else 'unknown'
+        swatches = ', '.join(
+            '#{:02X}{:02X}{:02X} {:.0%}'.format(*color, weight)
+            for color, weight in colors[:4]
+            )
+        print('{}: {} ({})'.format(path, name, swatches))
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv))
@@ -0,0 +1,47 @@
+"""Vectorized counterparts of the colorop conversions for numpy arrays."""
+
+import numpy as np
+
+
+def to_hsv_array(rgb):
+    """Convert an (..., 3) array of 0-255 rgb values to hue, sat and value arrays."""
+    rgb = np.asarray(rgb, dtype=np.float64) / 255
+    r, g, b = rgb[..., 0], rgb[..., 1], rgb[..., 2]
+    maxc = rgb.max(axis=-1)
+    chroma = maxc - rgb.min(axis=-1)
+    # Saturation is zero if Value is also zero
+    sat = np.divide(chroma, maxc, out=np.zeros_like(maxc), where=maxc > 0)
+    safe = np.where(chroma > 0, chroma, 1.)
+    hue = np.select(
+        [chroma == 0, maxc == r, maxc == g],
+        [0., (g-b) / safe % 6, (b-r) / safe + 2],
+        (r-g) / safe + 4,
+        )
+    # Return hue represented in degrees
+    return hue * 60, sat, maxc
+
+
+def to_rgb_array(hue, sat, val):
+    """Convert hue, sat and value arrays back to an (..., 3) uint8 rgb array."""
+    hue = np.asarray(hue, dtype=np.float64) % 360 / 60
+    sat = np.asarray(sat, dtype=np.float64)
+    val = np.asarray(val, dtype=np.float64)
+    chroma = sat * val
+    minc = np.round(255 * (val - chroma))
+    midc = np.round(255 * (chroma * (1 - np.abs(hue%2 - 1)) + (val - chroma)))
+    maxc = np.round(255 * val)
+    sextant = hue.astype(np.intp)[..., None]
+    # Channel order for each sextant of the hue circle, as in colorop.to_rgb.
+    order = np.choose(
+        sextant,
+        [
+            np.stack([maxc, midc, minc], axis=-1), # Red to Yellow
+            np.stack([midc, maxc, minc], axis=-1), # Yellow to Green
+            np.stack([minc, maxc, midc], axis=-1), # Green to Cyan
+            np.stack([minc, midc, maxc], axis=-1), # Cyan to Blue
+            np.stack([midc, minc, maxc], axis=-1), # Blue to Magenta
+            np.stack([maxc, minc, midc], axis=-1), # Magenta to Red
+            ],
+        mode='clip',
+        )
+    return order.astype(np.uint8)
@@ -1,10 +1,14 @@
 """Contains Sprites that control and display the blood colors to the user."""
 
 import random
+import numpy as np
 import pygame as pg
 
 from colorop import to_rgb, to_hsv
+from hemospectrum import COLORS, HUES, CASTES
+from sampling import HUE_SPREAD, SAT_RANGE, VAL_RANGE, caste_envelope, quasi_hsv
 from boilerplate import load_image
+from bulkgen import BulkJob
 from boilerplate import FreeSprite, TextSprite
 
 pg.scrap.init()
@@ -109,34 +113,128 @@ class CopyButton(Button):
             )
 
 
+class ColorModel:
+    """Observable color value whose derived representations are memoized.
+
+    The version counter is bumped and the cache dropped only when the value
+    actually changes, at which point every subscriber is called with the model.
+    """
+
+    def __init__(self, color=0x000000FF):
+        self._color = pg.Color(color)
+        self.version = 0
+        self._cache = {}
+        self._subscribers = []
+
+    @property
+    def color(self):
+        return self._color
+
+    @color.setter
+    def color(self, value):
+        if not isinstance(value, pg.Color):
+            value = pg.Color(value)
+        if value == self._color:
+            return
+        self._color = value
+        self.version += 1
+        self._cache.clear()
+        for callback in self._subscribers:
+            callback(self)
+
+    def subscribe(self, callback):
+        """Call the given function with the model whenever the color changes."""
+        self._subscribers.append(callback)
+        callback(self)
+
+    def _memo(self, name, func):
+        """Return a cached derived value, computing it on first use."""
+        try:
+            return self._cache[name]
+        except KeyError:
+            value = self._cache[name] = func()
+            return value
+
+    @property
+    def rgb(self):
+        """The color as an rgb tuple."""
+        return self._memo('rgb', lambda: tuple(self._color)[:3])
+
+    @property
+    def hsv(self):
+        """The color as an hsv tuple."""
+        return self._memo('hsv', lambda: to_hsv(self._color))
+
+    @property
+    def hexcode(self):
+        """The color as a 0xRRGGBB integer."""
+        return self._memo(
+            'hexcode',
+            lambda: (self._color.r*256 + self._color.g)*256 + self._color.b,
+            )
+
+    @property
+    def hexstr(self):
+        return self._memo(
+            'hexstr',
+            lambda: 'HEX: #{:06x}'.format(self.hexcode).upper(),
+            )
+
+    @property
+    def rgbstr(self):
+        return self._memo(
+            'rgbstr',
+            lambda: 'RGB: {:03d}, {:03d}, {:03d}'.format(*self.rgb),
+            )
+
+    @property
+    def hsvstr(self):
+        return self._memo(
+            'hsvstr',
+            lambda: 'HSV: {:05.1f}°, {:04.2f}, {:04.2f}'.format(*self.hsv),
+            )
+
+
 class ColorSet:
 
-    COLORS = [ # Hemospectrum Reference
-        pg.Color(0xA10000FF), # Burgundy
-        pg.Color(0xA15203FF), # Bronze
-        pg.Color(0xA1A100FF), # Ochre
-        pg.Color(0x658200FF), # Lime
-        pg.Color(0x416600FF), # Olive
-        pg.Color(0x078446FF), # Jade
-        pg.Color(0x008282FF), # Aqua
-        pg.Color(0x004182FF), # Cobalt
-        pg.Color(0x0041CBFF), # Indigo
-        pg.Color(0x631DB4FF), # Purple
-        pg.Color(0x6A006AFF), # Violet
-        pg.Color(0x99004DFF), # Fuchsia
-        ]
-
-    HUES = [0, 30, 60, 73, 82, 150, 180, 210, 240, 270, 300, 330]
-
-    def __init__(self):
+    # Hemospectrum Reference
+    COLORS = [pg.Color(color << 8 | 0xFF) for color in COLORS]
+    HUES = HUES
+    CASTES = CASTES
+    # Draws that may land on issued colors before picking from what's left.
+    MAX_MISSES = 64
+    # Size of the palettes made by generate all, the minimum rgb distance
+    # between their colors, and how many are moved into the history per frame.
+    BULK_COUNT = 1000
+    BULK_MIN_SEP = 0.
+    BULK_PER_FRAME = 50
+    # Sequence indices set aside for each color of a quasi-random generate all,
+    # so single generates made while it runs don't repeat its colors.
+    BULK_QUASI_RESERVE = 4
+
+    def __init__(self, registry=None, store=None, seed=None):
         # Square button dimensions and spacing.
         buttsize = 39
         buttgap = 40
         # Display font.
         self.font = pg.font.SysFont('couriernew', 25)
         # Default color (blapck).
-        self._color = pg.Color(0x000000FF)
+        self.model = ColorModel(0x000000FF)
+        # Set whenever a button changes state, so update can skip idle frames.
+        self.dirty = True
         self.base_hue = 0
+        # Low-discrepancy generation mode and its position in the sequence.
+        self.quasi = False
+        self.quasi_index = 0
+        # Optional IssuanceRegistry that generated colors must be new to.
+        self.registry = registry
+        # Optional PaletteStore that generated colors are saved to.
+        self.store = store
+        # Every color of each (caste, mutant) envelope, built as needed.
+        self.envelopes = {}
+        # Seed of this session's generator, saved along with its colors.
+        self.seed = random.randrange(1 << 32) if seed is None else seed
+        self.rng = random.Random(self.seed)
         # Color sprites.
         self.panel = FreeSprite(
             pg.Surface((200, 200)),
@@ -147,6 +245,12 @@ class ColorSet:
             ColorHistoryButton(pos=(250 + 45*(i//5), 40 + buttgap*(i%5)))
             for i in range(10)
             ]
+        # Every previous color as (color, hue), newest last. The history
+        # buttons show a scrollable window onto it.
+        self.history = []
+        self.scroll = 0
+        # Running BulkJob of generate all, if any.
+        self.job = None
         # Button sprites.
         self.castebuttons = [
             ColorButton(
@@ -207,105 +311,275 @@ class ColorSet:
             color=pg.Color(0xFFFFFFFF),
             pos=(90, 346),
             )
+        self.statustext = TextSprite(
+            font=self.font,
+            aa=True,
+            color=pg.Color(0xFFFFFFFF),
+            pos=(40, 400),
+            )
         # Initialize sprite data.
         self.panel.hue = self.base_hue
         self.castebuttons[self.base_hue].active = True
+        self.model.subscribe(self.show_color)
 
     def colorhex(self):
         """Returns the panel's current color as a hexstring."""
-        hexcolor = (self._color.r*256 + self._color.g)*256 + self._color.b
-        return 'HEX: #{:06x}'.format(hexcolor).upper()
+        return self.model.hexstr
 
     def colorrgb(self):
         """Returns the panel's current color as a string."""
-        return 'RGB: {rgb.r:03d}, {rgb.g:03d}, {rgb.b:03d}'.format(rgb=self._color)
+        return self.model.rgbstr
 
     def colorhsv(self):
         """Returns the panel's current hsv color as a string."""
-        return 'HSV: {:05.1f}°, {:04.2f}, {:04.2f}'.format(*to_hsv(self._color))
+        return self.model.hsvstr
+
+    def show_color(self, model):
+        """Redraw the panel and color text when the model changes."""
+        self.panel.image.fill(model.color)
+        self.hextext.text = model.hexstr
+        self.rgbtext.text = model.rgbstr
+        self.hsvtext.text = model.hsvstr
 
     @property
     def color(self):
         """The panel's current color value."""
-        return self._color
+        return self.model.color
 
     @color.setter
     def color(self, value):
         """Update panel and history when color is assigned to."""
-        for i in range(len(self.oldcolors) - 1, 0, -1):
-            self.oldcolors[i].color = self.oldcolors[i - 1].color
-            self.oldcolors[i].hue = self.oldcolors[i - 1].hue
-        self.oldcolors[0].color = self._color
-        self.oldcolors[0].hue = self.panel.hue
-        self._color = value
+        self.history.append((self.model.color, self.panel.hue))
         self.panel.hue = self.base_hue
+        self.model.color = value
+        self.show_history()
+
+    def show_history(self):
+        """Point the history buttons at the visible part of the history."""
+        for i, button in enumerate(self.oldcolors):
+            pos = len(self.history) - 1 - self.scroll - i
+            button.color, button.hue = self.history[pos] if pos >= 0 else (0x000000, 0)
+
+    def scroll_history(self, columns):
+        """Scroll the history by whole columns of buttons, older for positive."""
+        last = max(0, len(self.history) - len(self.oldcolors))
+        self.scroll = max(0, min(self.scroll + columns*5, last))
+        self.show_history()
 
     def swap_color(self, idx):
         """Swap the currently used color with the given history index."""
         self.oldcolors[idx].pressed = True
+        self.dirty = True
+        pos = len(self.history) - 1 - self.scroll - idx
+        if pos < 0:
+            return
         # Reset caste buttons.
         self.castebuttons[self.base_hue].active = False
         # Perform swap.
-        self._color, self.oldcolors[idx].color = self.oldcolors[idx].color, self._color
-        self.panel.hue, self.oldcolors[idx].hue = self.oldcolors[idx].hue, self.panel.hue
-        self.base_hue = self.panel.hue
+        color, hue = self.history[pos]
+        self.history[pos] = (self.model.color, self.panel.hue)
+        self.panel.hue = self.base_hue = hue
         self.castebuttons[self.base_hue].active = True
+        self.model.color = color
+        self.show_history()
         
     def _generate(self):
-        """Randomly generate a blood color."""
+        """Randomly generate a blood color, skipping already issued ones."""
+        for _ in range(self.MAX_MISSES):
+            if self.quasi:
+                color = self._draw_quasi()
+            else:
+                color = self._draw()
+            if self.registry is None or self.registry.claim(color):
+                break
+        else:
+            # Most of the envelope is issued, so pick from what's left of it.
+            color = self._draw_unissued()
+            if color is None:
+                self.statustext.text = 'NO {} LEFT'.format(
+                    'COLORS' if self.randombutton.active
+                    else self.CASTES[self.base_hue].upper()
+                    )
+                return
+        self.statustext.text = ''
+        self.color = color
+        if self.store is not None:
+            self.store.add(color, self.base_hue, self.mode, self.seed)
+
+    def _draw_unissued(self):
+        """Claim a color evenly from the unissued rest of the caste's envelope.
+
+        Every caste is tried when the caste is random. Returns None if all of
+        their colors are issued.
+        """
+        mutant = self.mutantbutton.active
+        castes = list(range(12)) if self.randombutton.active else [self.base_hue]
+        self.rng.shuffle(castes)
+        for caste in castes:
+            key = caste, mutant
+            if key not in self.envelopes:
+                self.envelopes[key] = caste_envelope(self.HUES, caste, mutant)
+            left = self.registry.unissued(self.envelopes[key])
+            # Other processes may claim some in the meantime.
+            while len(left):
+                idx = self.rng.randrange(len(left))
+                code = int(left[idx])
+                if self.registry.claim(code):
+                    self.castebuttons[self.base_hue].active = False
+                    self.base_hue = caste
+                    self.castebuttons[self.base_hue].active = True
+                    return pg.Color(code << 8 | 0xFF)
+                left = np.delete(left, idx)
+        return None
+
+    @property
+    def mode(self):
+        """Name of the current generation mode."""
+        mode = 'quasi' if self.quasi else 'random'
+        return mode + '-mutant' if self.mutantbutton.active else mode
+
+    def _draw(self):
+        """Draw a random color from the current caste's envelope."""
         if self.randombutton.active:
             # Randomly generate the caste too, if that option's active.
             self.castebuttons[self.base_hue].active = False
-            self.base_hue = random.randrange(12)
+            self.base_hue = self.rng.randrange(12)
             self.castebuttons[self.base_hue].active = True
         if not self.mutantbutton.active:
             # Induce slight variations in hue.
-            hue = self.HUES[self.base_hue] + random.triangular(0., 7.5, 0.)
+            hue = self.HUES[self.base_hue] + self.rng.triangular(*HUE_SPREAD)
             # Saturation and value range between defined limits.
-            sat = random.triangular(0.8, 1.0, 0.98)
-            val = random.triangular(0.4, 0.8, 0.57)
+            sat = self.rng.triangular(*SAT_RANGE)
+            val = self.rng.triangular(*VAL_RANGE)
         else:
             # Make any color possible.
-            hue = self.base_hue * 30 + random.uniform(-15., 15.)
+            hue = self.base_hue * 30 + self.rng.uniform(-15., 15.)
             if hue < 0:
                 hue += 360
-            sat = random.random()
-            val = random.random()
-        self.color = to_rgb((hue, sat, val))
+            sat = self.rng.random()
+            val = self.rng.random()
+        return to_rgb((hue, sat, val))
+
+    def _draw_quasi(self):
+        """Draw the next color of the low-discrepancy sequence."""
+        castes, hue, sat, val = quasi_hsv(
+            self.HUES, self.quasi_index, self.quasi_index + 1,
+            caste=None if self.randombutton.active else self.base_hue,
+            mutant=self.mutantbutton.active,
+            )
+        self.quasi_index += 1
+        self.castebuttons[self.base_hue].active = False
+        self.base_hue = int(castes[0])
+        self.castebuttons[self.base_hue].active = True
+        return to_rgb((float(hue[0]), float(sat[0]), float(val[0])))
 
     def generate(self):
         """Allow the button to update state when generate is used."""
         self.genbutton.pressed = True
+        self.dirty = True
         self._generate()
 
-    def generate_all(self):
-        """Fills up the history bar with generated shades and tints."""
+    def generate_all(self, loop):
+        """Fills up the history with generated shades and tints.
+
+        Colors are generated on the loop's executor and moved into the
+        history a few per frame by receive. Pressing it again cancels, and
+        whatever was already generated is still moved in.
+        """
         self.pressed = True
         self.genallbutton.pressed = True
-        for _ in range(11):
-            self._generate()
+        self.dirty = True
+        if self.job is not None:
+            self.job.cancel()
+            return
+        quasi_start = None
+        if self.quasi:
+            quasi_start = self.quasi_index
+            self.quasi_index += self.BULK_COUNT * self.BULK_QUASI_RESERVE
+        self.job = BulkJob(
+            loop, self.BULK_COUNT, self.HUES,
+            caste=None if self.randombutton.active else self.base_hue,
+            mutant=self.mutantbutton.active,
+            min_sep=self.BULK_MIN_SEP,
+            registry=self.registry,
+            seed=self.rng.randrange(1 << 32),
+            quasi_start=quasi_start,
+            quasi_stop=self.quasi_index if self.quasi else None,
+            mode=self.mode,
+            )
+
+    def receive(self):
+        """Move colors finished by the bulk job into the history."""
+        job = self.job
+        if job is None:
+            return
+        batch = job.take(self.BULK_PER_FRAME)
+        if batch:
+            colors = [(pg.Color(code << 8 | 0xFF), caste) for code, caste in batch]
+            # Same as assigning each color in turn, without redrawing each one.
+            self.history.append((self.model.color, self.panel.hue))
+            self.history.extend(colors[:-1])
+            color, caste = colors[-1]
+            # Like _draw, only jobs of random castes change the caste set.
+            if job.caste is None and caste != self.base_hue:
+                self.castebuttons[self.base_hue].active = False
+                self.castebuttons[caste].active = True
+                self.base_hue = caste
+                self.dirty = True
+            self.panel.hue = caste
+            self.model.color = color
+            self.show_history()
+            if self.store is not None:
+                for color, caste in colors:
+                    self.store.add(color, caste, job.mode, job.seed)
+            self.statustext.text = 'GENERATED {}/{}'.format(job.received, job.count)
+        if job.finished:
+            self.job = None
+            # Raise anything that went wrong on the worker.
+            job.future.result()
+            if job.received < job.count and not job.cancelled:
+                # The worker ran out of new colors to try.
+                self.statustext.text = 'ONLY GENERATED {}/{}'.format(job.received, job.count)
+            else:
+                self.statustext.text = ''
+
+    def draw_status(self, surf):
+        """Draws bulk generation progress or the last notice, if there is any."""
+        if self.statustext.text:
+            self.statustext.draw(surf)
 
     def set_caste(self, idx):
         """Set the current caste to genereate blood colors from."""
-        self.castebuttons[idx].active = True
         self.castebuttons[idx].pressed = True
-        self.castebuttons[self.base_hue].active = False
-        # Set new caste hue.
-        self.base_hue = idx
+        self.dirty = True
+        if idx != self.base_hue:
+            self.castebuttons[self.base_hue].active = False
+            self.castebuttons[idx].active = True
+            # Set new caste hue.
+            self.base_hue = idx
 
     def toggle_mutant(self):
         """Toggles allowing potential mutant colors."""
         self.mutantbutton.active = not self.mutantbutton.active
         self.mutantbutton.pressed = True
+        self.dirty = True
+
+    def toggle_quasi(self):
+        """Toggles drawing colors from a low-discrepancy sequence."""
+        self.quasi = not self.quasi
+        # Start from a random point so sessions don't repeat each other.
+        self.quasi_index = self.rng.randrange(1 << 20)
 
     def toggle_random(self):
         """Toggles randomizing of blood caste."""
         self.randombutton.active = not self.randombutton.active
         self.randombutton.pressed = True
+        self.dirty = True
 
     def clip_color(self, idx):
         """Copy color data to clipboard."""
         self.copybuttons[idx].pressed = True
+        self.dirty = True
         if idx == 0:
             pg.scrap.put(
                 pg.SCRAP_TEXT,
@@ -314,20 +588,19 @@ class ColorSet:
         elif idx == 1:
             pg.scrap.put(
                 pg.SCRAP_TEXT,
-                '{rgb.r}, {rgb.g}, {rgb.b}'.format(
-                    rgb=self._color
-                    ).encode()
+                '{}, {}, {}'.format(*self.model.rgb).encode()
                 )
         elif idx == 2:
             pg.scrap.put(
                 pg.SCRAP_TEXT,
                 '{hsv[0]:.1f}, {hsv[1]:.2f}, {hsv[2]:.2f}'.format(
-                    hsv=to_hsv(self._color)
+                    hsv=self.model.hsv
                     ).encode()
                 )
 
     def unpress(self):
         """Resets pressed buttons."""
+        self.dirty = True
         if self.genbutton.pressed:
             self.genbutton.pressed = False
         elif self.genallbutton.pressed:
@@ -351,13 +624,13 @@ class ColorSet:
         return getattr(self, button).rect.collidepoint(cursor)
 
     def update(self):
-        """Updates object states."""
-        # Update display value.
-        self.panel.image.fill(self._color)
-        self.hextext.text = self.colorhex()
-        self.rgbtext.text = self.colorrgb()
-        self.hsvtext.text = self.colorhsv()
-        # Update buttons.
+        """Updates button states, if any have changed since the last call.
+
+        Color display is driven by the model's subscribers instead.
+        """
+        if not self.dirty:
+            return
+        self.dirty = False
         for button in self.castebuttons:
             button.update()
         for button in self.oldcolors:
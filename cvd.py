@@ -0,0 +1,186 @@
+#!/usr/bin/env python
+"""Color vision deficiency simulation through a precomputed 3D lookup table.
+
+usage: cvd.py protan|deutan|tritan [HEXCOLOR ...]
+
+Prints the pairs of the given colors, or colors read from stdin, that become
+hard to tell apart under the given deficiency.
+"""
+
+import os
+import sys
+import tempfile
+
+import numpy as np
+import pygame as pg
+
+# Machado, Oliveira and Fernandes (2009) matrices at full severity, in linear rgb.
+MATRICES = {
+    'protan': np.array([
+        [0.152286, 1.052583, -0.204868],
+        [0.114503, 0.786281, 0.099216],
+        [-0.003882, -0.048116, 1.051998],
+        ]),
+    'deutan': np.array([
+        [0.367322, 0.860646, -0.227968],
+        [0.280085, 0.672501, 0.047413],
+        [-0.011820, 0.042940, 0.968881],
+        ]),
+    'tritan': np.array([
+        [1.255528, -0.076749, -0.178779],
+        [-0.078411, 0.930809, 0.147602],
+        [0.004733, 0.691367, 0.303900],
+        ]),
+    }
+KINDS = tuple(MATRICES)
+# Linear rgb to CIE XYZ under D65, and the D65 white point.
+XYZ = np.array([
+    [0.4124, 0.3576, 0.1805],
+    [0.2126, 0.7152, 0.0722],
+    [0.0193, 0.1192, 0.9505],
+    ])
+WHITE = XYZ.sum(axis=1)
+# Colors closer than this CIE76 delta E are treated as indistinguishable.
+MIN_DELTA_E = 10.
+# Reds simulated at once when building a table. Each takes about 14 MB of
+# float temporaries on top of the table itself.
+BUILD_REDS = 4
+
+
+def to_linear(rgb):
+    """Decode 0-255 srgb values to linear light."""
+    c = np.asarray(rgb, dtype=np.float64) / 255
+    return np.where(c <= 0.04045, c / 12.92, ((c + 0.055) / 1.055) ** 2.4)
+
+
+def to_srgb(linear):
+    """Encode linear light back to 0-255 srgb values."""
+    c = np.clip(linear, 0., 1.)
+    c = np.where(c <= 0.0031308, c * 12.92, 1.055 * c ** (1 / 2.4) - 0.055)
+    return c * 255
+
+
+def simulate(rgb, kind):
+    """Simulate a deficiency on an (..., 3) rgb array exactly, as floats."""
+    return to_srgb(to_linear(rgb) @ MATRICES[kind].T)
+
+
+def to_lab(rgb):
+    """Convert an (..., 3) rgb array to CIE Lab."""
+    xyz = to_linear(rgb) @ XYZ.T / WHITE
+    f = np.where(xyz > 216 / 24389, np.cbrt(xyz), (24389 / 27 * xyz + 16) / 116)
+    return np.stack([
+        116 * f[..., 1] - 16,
+        500 * (f[..., 0] - f[..., 1]),
+        200 * (f[..., 1] - f[..., 2]),
+        ], axis=-1)
+
+
+def pack(rgb):
+    """Pack an (..., 3) rgb array into 0xRRGGBB integers."""
+    rgb = np.asarray(rgb).astype(np.uint32)
+    return rgb[..., 0] << 16 | rgb[..., 1] << 8 | rgb[..., 2]
+
+
+def unpack(codes):
+    """Unpack 0xRRGGBB integers into an (..., 3) uint8 rgb array."""
+    codes = np.asarray(codes)
+    return np.stack([codes >> 16, codes >> 8, codes], axis=-1).astype(np.uint8)
+
+
+class CVDFilter:
+    """A deficiency simulation baked into a full 256 cubed lookup table.
+
+    The table maps every 0xRRGGBB color to its simulated 0xRRGGBB color, so
+    filtering is a single gather per pixel. It takes 64 MB, and building it
+    takes a few seconds and about 120 MB at peak. When a cache_dir is given it
+    is saved there, 64 MB for each kind, and memory-mapped on later runs.
+    A cached table that can't be read is built again.
+    """
+
+    def __init__(self, kind, cache_dir=None):
+        self.kind = kind
+        path = None
+        if cache_dir is not None:
+            path = os.path.join(cache_dir, 'cvd_{}.npy'.format(kind))
+        if path and os.path.exists(path):
+            try:
+                self.lut = np.load(path, mmap_mode='r')
+            except (OSError, ValueError):
+                pass
+            else:
+                if self.lut.shape == (1 << 24,) and self.lut.dtype == np.uint32:
+                    return
+        self.lut = np.empty(1 << 24, np.uint32)
+        gb = np.arange(1 << 16)
+        # Build a few reds at a time to keep the float temporaries small.
+        for red in range(0, 256, BUILD_REDS):
+            codes = (np.arange(red, red + BUILD_REDS)[:, None] << 16 | gb).ravel()
+            self.lut[codes] = pack(simulate(unpack(codes), kind).round())
+        if path:
+            os.makedirs(cache_dir, exist_ok=True)
+            # Write to a temporary file first, so a crash or another instance
+            # building the same table never leaves a partial one in place.
+            fd, temp = tempfile.mkstemp(suffix='.npy', dir=cache_dir)
+            try:
+                with os.fdopen(fd, 'wb') as file:
+                    np.save(file, self.lut)
+                os.replace(temp, path)
+            except OSError:
+                # The disk may be full, or on Windows another instance may
+                # have the table open. It still works, just uncached.
+                pass
+            finally:
+                if os.path.exists(temp):
+                    os.remove(temp)
+
+    def apply(self, rgb):
+        """Return the simulated colors of an (..., 3) rgb array."""
+        return unpack(self.lut[pack(rgb)])
+
+    def apply_surface(self, surf):
+        """Simulate the deficiency on a surface in place."""
+        if surf.get_bitsize() == 32 and surf.get_masks()[:3] == (0xFF0000, 0xFF00, 0xFF):
+            # Mapped pixels of xrgb surfaces are the table's indices already.
+            pixels = pg.surfarray.pixels2d(surf)
+            pixels[...] = self.lut[pixels.view(np.uint32) & 0xFFFFFF]
+        else:
+            pixels = pg.surfarray.pixels3d(surf)
+            pixels[...] = self.apply(pixels)
+
+
+def confusable_pairs(colors, kind, min_delta=MIN_DELTA_E, chunk=1024):
+    """Return (i, j, delta E) for color pairs that only a deficiency confuses.
+
+    Pairs already closer than min_delta with normal vision are left out.
+    """
+    rgb = np.asarray(colors, dtype=np.float64).reshape(-1, 3)
+    lab = to_lab(rgb)
+    sim = to_lab(simulate(rgb, kind))
+    pairs = []
+    # Compare in row chunks so large palettes don't need an n by n matrix.
+    for start in range(0, len(rgb), chunk):
+        stop = min(start + chunk, len(rgb))
+        before = np.linalg.norm(lab[start:stop, None] - lab[None], axis=-1)
+        after = np.linalg.norm(sim[start:stop, None] - sim[None], axis=-1)
+        rows, cols = np.nonzero((after < min_delta) & (before >= min_delta))
+        for i, j in zip(rows + start, cols):
+            if i < j:
+                pairs.append((int(i), int(j), float(after[i - start, j])))
+    return pairs
+
+
+def main(argv):
+    if len(argv) < 2 or argv[1] not in KINDS:
+        print(__doc__)
+        return 2
+    names = argv[2:] or sys.stdin.read().split()
+    colors = unpack([int(name.lstrip('#'), 16) for name in names])
+    pairs = confusable_pairs(colors, argv[1])
+    for i, j, delta in pairs:
+        print('{} ~ {} (delta E {:.1f})'.format(names[i], names[j], delta))
+    return 1 if pairs else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv))
@@ -1,11 +1,17 @@
 #!/usr/bin/env python
 
+import argparse
+from concurrent.futures import ThreadPoolExecutor
+
 import pygame as pg
 
 from colorset import ColorSet
 from boilerplate import load_image
-from boilerplate import AppExit, AppState, FreeSprite
+from boilerplate import AppExit, AsyncState, FreeSprite
 from boilerplate import Appli, Window
+from registry import IssuanceRegistry
+from palettestore import PaletteStore
+from cvd import KINDS, CVDFilter
 
 
 class Gamzee(FreeSprite):
@@ -18,16 +24,32 @@ class Gamzee(FreeSprite):
             )
 
 
-class ColorMenu(AppState):
+class ColorMenu(AsyncState):
     """docstring"""
 
+    CONFIG = {pg.K_q: 'quasi', pg.K_c: 'cvd'}
+    # Where color vision deficiency lookup tables are cached between runs.
+    CVD_CACHE = 'cache'
+    # Shared IssuanceRegistry, if colors must be globally unique.
+    registry = None
+    # PaletteStore to save generated colors to, if any.
+    store = None
+
     def __init__(self):
         self.bg = pg.Surface(self.window.rect.size)
         self.panel = load_image('panel.png', colorkey=0xFF00FF)
         self.gamzee = Gamzee(topright=(self.window.rect.topright))
-        self.colorset = ColorSet()
+        self.colorset = ColorSet(registry=self.registry, store=self.store)
+        # Deficiency simulated on the final frame, if any, and its filter
+        # once that is ready.
+        self.cvd_kind = None
+        self.cvd = None
+        self.cvd_filters = {}
+        # Filters being built, one at a time so their memory use doesn't add up.
+        self.cvd_builds = {}
+        self.cvd_executor = ThreadPoolExecutor(1)
 
-    def eval_events(self):
+    async def eval_events(self):
         """Handles all event logic."""
         for event in pg.event.get():
             if event.type == pg.QUIT:
@@ -38,7 +60,7 @@ class ColorMenu(AppState):
                     if self.colorset.isclicked('genbutton', pos):
                         self.colorset.generate()
                     elif self.colorset.isclicked('genallbutton', pos):
-                        self.colorset.generate_all()
+                        self.colorset.generate_all(self.owner.loop)
                     elif self.colorset.isclicked('mutantbutton', pos):
                         self.colorset.toggle_mutant()
                     elif self.colorset.isclicked('randombutton', pos):
@@ -49,9 +71,6 @@ class ColorMenu(AppState):
                         idx = rpos.collidelist(self.colorset.castebuttons)
                         if idx >= 0:
                             # Switch caste hue
-                            if self.colorset.castebuttons[idx].active:
-                                self.colorset.castebuttons[idx].pressed = True
-                                continue
                             self.colorset.set_caste(idx)
                             continue
                         idx = rpos.collidelist(self.colorset.oldcolors)
@@ -63,12 +82,57 @@ class ColorMenu(AppState):
                         if idx >= 0:
                             self.colorset.clip_color(idx)
                             continue
+            elif event.type == pg.KEYDOWN:
+                action = self.CONFIG.get(event.key)
+                if action == 'quasi':
+                    self.colorset.toggle_quasi()
+                elif action == 'cvd':
+                    self.cycle_cvd()
             elif event.type == pg.MOUSEBUTTONUP:
                 if event.button == 1:
                     self.colorset.unpress()
+            elif event.type == pg.MOUSEWHEEL:
+                # Wheel up goes towards the newest colors.
+                self.colorset.scroll_history(-event.y)
+
+    def cycle_cvd(self):
+        """Switch to simulating the next color vision deficiency, or none.
+
+        A filter that isn't loaded yet is built on an executor, and the
+        overlay turns on once it's ready.
+        """
+        kinds = (None,) + KINDS
+        kind = kinds[(kinds.index(self.cvd_kind) + 1) % len(kinds)]
+        self.cvd_kind = kind
+        if kind is not None and kind not in self.cvd_filters and kind not in self.cvd_builds:
+            # Building a table takes a few seconds, but only once per cache.
+            self.cvd_builds[kind] = self.owner.loop.run_in_executor(
+                self.cvd_executor, CVDFilter, kind, self.CVD_CACHE,
+                )
+        self.cvd = self.cvd_filters.get(kind)
+
+    def receive_cvd(self):
+        """Pick up finished filters, turning on the overlay if it's still wanted."""
+        for kind, future in list(self.cvd_builds.items()):
+            if future.done():
+                del self.cvd_builds[kind]
+                self.cvd_filters[kind] = future.result()
+                if kind == self.cvd_kind:
+                    self.cvd = self.cvd_filters[kind]
+
+    def eval_exit(self):
+        """Stop bulk generation and save colors waiting to be stored before exiting."""
+        if self.colorset.job is not None:
+            self.colorset.job.cancel()
+        self.cvd_executor.shutdown(wait=False, cancel_futures=True)
+        if self.store is not None:
+            self.store.close()
+        raise AppExit
 
-    def eval_logic(self):
+    async def eval_logic(self):
         """Handles logic not requiring event handling."""
+        self.colorset.receive()
+        self.receive_cvd()
         self.colorset.update()
 
     def display(self):
@@ -77,16 +141,54 @@ class ColorMenu(AppState):
         drawsurf.blit(self.bg, (0, 0))
         self.colorset.draw(drawsurf)
         drawsurf.blit(self.panel, (0, 0))
+        self.colorset.draw_status(drawsurf)
         self.gamzee.draw(drawsurf)
+        if self.cvd is not None:
+            self.cvd.apply_surface(drawsurf)
         pg.display.flip()
 
-app = Appli(
-    window=Window(
+
+def make_window():
+    """Create the main application window."""
+    return Window(
         name='Fantroll Hemopicker',
         size=(800, 600),
         flags=pg.HWSURFACE,
-        ),
-    state='picker'
-    )
-app.set_states(picker=ColorMenu)
-app.run()
+        )
+
+
+def make_app(window=None):
+    """Create the application with the picker menu as its state."""
+    app = Appli(
+        window=window or make_window(),
+        state='picker'
+        )
+    app.set_states(picker=ColorMenu)
+    # Bulk generation runs on the loop's executor.
+    app.do_async = True
+    return app
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Fantroll Hemopicker')
+    parser.add_argument(
+        '--registry',
+        help='bitset file of issued colors; generated colors will be unique',
+        )
+    parser.add_argument(
+        '--store',
+        help='sqlite database to save every generated color to',
+        )
+    args = parser.parse_args()
+    if args.registry:
+        ColorMenu.registry = IssuanceRegistry(args.registry)
+    if args.store:
+        ColorMenu.store = PaletteStore(args.store)
+    try:
+        make_app().run()
+    finally:
+        # Save queued colors even if the app crashed, since they're claimed.
+        if ColorMenu.store is not None:
+            ColorMenu.store.close()
+        if ColorMenu.registry is not None:
+            ColorMenu.registry.close()
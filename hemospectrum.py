@@ -0,0 +1,25 @@
+"""Reference data of the hemospectrum, shared by modules that need no display."""
+
+# Canon blood color of each caste, as 0xRRGGBB hexcolors.
+COLORS = [
+    0xA10000, # Burgundy
+    0xA15203, # Bronze
+    0xA1A100, # Ochre
+    0x658200, # Lime
+    0x416600, # Olive
+    0x078446, # Jade
+    0x008282, # Aqua
+    0x004182, # Cobalt
+    0x0041CB, # Indigo
+    0x631DB4, # Purple
+    0x6A006A, # Violet
+    0x99004D, # Fuchsia
+    ]
+
+# Hue each caste's non-mutant colors are generated from.
+HUES = [0, 30, 60, 73, 82, 150, 180, 210, 240, 270, 300, 330]
+
+CASTES = [
+    'Burgundy', 'Bronze', 'Ochre', 'Lime', 'Olive', 'Jade',
+    'Aqua', 'Cobalt', 'Indigo', 'Purple', 'Violet', 'Fuchsia',
+    ]
@@ -0,0 +1,121 @@
+"""Persistent, indexed store of generated blood colors backed by SQLite."""
+
+import time
+import sqlite3
+
+import numpy as np
+
+from colorop import to_hsv
+from colorarray import to_hsv_array
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS colors (
+    id INTEGER PRIMARY KEY,
+    rgb INTEGER NOT NULL,
+    caste INTEGER NOT NULL,
+    mode TEXT NOT NULL,
+    seed INTEGER,
+    hue REAL NOT NULL,
+    sat REAL NOT NULL,
+    val REAL NOT NULL,
+    created REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS colors_caste_val ON colors (caste, val);
+CREATE INDEX IF NOT EXISTS colors_caste_hue ON colors (caste, hue);
+CREATE INDEX IF NOT EXISTS colors_hue ON colors (hue);
+CREATE INDEX IF NOT EXISTS colors_val ON colors (val);
+"""
+COLUMNS = ('rgb', 'caste', 'mode', 'seed', 'hue', 'sat', 'val', 'created')
+INSERT = 'INSERT INTO colors ({}) VALUES ({})'.format(
+    ', '.join(COLUMNS), ', '.join('?' * len(COLUMNS)),
+    )
+
+
+class PaletteStore:
+    """Buffers generated colors and writes them out in batched transactions.
+
+    A batch is written once it is full or flush_interval seconds after the
+    last write, whichever comes first.
+    """
+
+    def __init__(self, path, batch_size=1000, flush_interval=5.):
+        self.conn = sqlite3.connect(path)
+        # Write-ahead logging lets readers stream while colors are added.
+        self.conn.execute('PRAGMA journal_mode=WAL')
+        self.conn.execute('PRAGMA synchronous=NORMAL')
+        # A larger page cache keeps index upkeep cheap on bulk inserts.
+        self.conn.execute('PRAGMA cache_size=-65536')
+        self.conn.executescript(SCHEMA)
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.flushed = time.time()
+        self.pending = []
+
+    def add(self, color, caste, mode, seed=None):
+        """Queue one color, given as an rgb tuple or hexcolor, for insertion."""
+        if not isinstance(color, int):
+            r, g, b = color[:3]
+            color = (r*256 + g)*256 + b
+        now = time.time()
+        self.pending.append((color, caste, mode, seed, *to_hsv(color), now))
+        if (len(self.pending) >= self.batch_size
+                or now - self.flushed >= self.flush_interval):
+            self.flush()
+
+    def add_many(self, rgb, castes, mode, seed=None):
+        """Insert an (n, 3) rgb array and its castes in one transaction."""
+        rgb = np.asarray(rgb, dtype=np.int64)
+        hue, sat, val = to_hsv_array(rgb)
+        codes = (rgb[:, 0]*256 + rgb[:, 1])*256 + rgb[:, 2]
+        castes = np.broadcast_to(castes, codes.shape)
+        now = time.time()
+        self.flush()
+        with self.conn:
+            self.conn.executemany(INSERT, zip(
+                codes.tolist(), castes.tolist(), [mode] * len(codes), [seed] * len(codes),
+                hue.tolist(), sat.tolist(), val.tolist(), [now] * len(codes),
+                ))
+
+    def flush(self):
+        """Write all queued colors."""
+        self.flushed = time.time()
+        if not self.pending:
+            return
+        with self.conn:
+            self.conn.executemany(INSERT, self.pending)
+        self.pending = []
+
+    def query(self, caste=None, hue=None, val=None, sat=None, limit=None, chunk=1000):
+        """Yield stored colors as dicts, streaming them from the database.
+
+        hue, val and sat are inclusive (low, high) ranges. Rows are fetched
+        a chunk at a time, so results never need to fit in memory.
+        """
+        clauses, params = [], []
+        if caste is not None:
+            clauses.append('caste = ?')
+            params.append(caste)
+        for name, bounds in (('hue', hue), ('val', val), ('sat', sat)):
+            if bounds is not None:
+                clauses.append('{} BETWEEN ? AND ?'.format(name))
+                params.extend(bounds)
+        sql = 'SELECT {} FROM colors'.format(', '.join(COLUMNS))
+        if clauses:
+            sql += ' WHERE ' + ' AND '.join(clauses)
+        if limit is not None:
+            sql += ' LIMIT ?'
+            params.append(limit)
+        cursor = self.conn.execute(sql, params)
+        try:
+            while True:
+                rows = cursor.fetchmany(chunk)
+                if not rows:
+                    return
+                for row in rows:
+                    yield dict(zip(COLUMNS, row))
+        finally:
+            cursor.close()
+
+    def close(self):
+        self.flush()
+        self.conn.close()
@@ -0,0 +1,99 @@
+#!/usr/bin/env python
+"""Batch recoloring of character sprites to generated blood colors."""
+
+import os
+import sys
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import pygame as pg
+
+from colorop import to_hsv
+from colorarray import to_hsv_array, to_rgb_array
+
+
+class Recolorer:
+    """Caches the blood-colored region of a sprite so variants are cheap to make.
+
+    The region mask and its shading, stored as hue offsets and saturation and
+    value ratios relative to the source blood color, are computed once. Each
+    variant is then a single vectorized hsv conversion over the masked pixels.
+    """
+
+    def __init__(self, image, source=0x391E71, **kwargs):
+        if not isinstance(image, pg.Surface):
+            image = pg.image.load(image)
+        self.image = image
+        self.colorkey = kwargs.get('colorkey', image.get_colorkey())
+        # Hue, sat and value of the blood color the sprite was drawn with.
+        self.src_hue, self.src_sat, self.src_val = to_hsv(source)
+        rgb = pg.surfarray.array3d(image)
+        hue, sat, val = to_hsv_array(rgb)
+        # Signed hue distance from the source blood color.
+        offset = (hue - self.src_hue + 180) % 360 - 180
+        self.mask = (
+            (np.abs(offset) <= kwargs.get('hue_range', 40.))
+            & (sat >= kwargs.get('min_sat', 0.25))
+            & (val >= kwargs.get('min_val', 0.1))
+            )
+        if image.get_flags() & pg.SRCALPHA:
+            self.mask &= pg.surfarray.array_alpha(image) > 0
+        if self.colorkey is not None:
+            # Keys given as ints are mapped pixels, as with Surface.set_colorkey.
+            key = self.colorkey
+            if isinstance(key, int):
+                key = image.unmap_rgb(key)
+            self.mask &= (rgb != tuple(key)[:3]).any(axis=-1)
+        # Shading of the masked region, kept as flat arrays.
+        self.hue_offset = offset[self.mask]
+        self.sat_ratio = sat[self.mask] / self.src_sat
+        self.val_ratio = val[self.mask] / self.src_val
+
+    def recolor(self, color):
+        """Return a copy of the sprite with its blood region in the given color."""
+        hue, sat, val = to_hsv(color)
+        surf = self.image.copy()
+        pixels = pg.surfarray.pixels3d(surf)
+        pixels[self.mask] = to_rgb_array(
+            hue + self.hue_offset,
+            np.clip(sat * self.sat_ratio, 0., 1.),
+            np.clip(val * self.val_ratio, 0., 1.),
+            )
+        # Release the surface lock before handing it off.
+        del pixels
+        if self.colorkey is not None:
+            surf.set_colorkey(self.colorkey)
+        return surf
+
+    def save(self, color, path):
+        """Recolor the sprite and write it to the given path."""
+        pg.image.save(self.recolor(color), path)
+        return path
+
+    def save_all(self, colors, dirname, name='{:06X}.png', workers=None):
+        """Write one variant per color into a directory in parallel."""
+        os.makedirs(dirname, exist_ok=True)
+        colors = [
+            int(color) >> 8 if isinstance(color, pg.Color) else color
+            for color in colors
+            ]
+        paths = [os.path.join(dirname, name.format(color)) for color in colors]
+        with ThreadPoolExecutor(workers) as pool:
+            return list(pool.map(self.save, colors, paths))
+
+
+def main(argv):
+    """Recolor a sprite to every hex color given, or read from stdin."""
+    if len(argv) < 3:
+        print('usage: recolor.py SPRITE OUTDIR [HEXCOLOR ...]')
+        return 2
+    colors = argv[3:] or sys.stdin.read().split()
+    colors = [int(color.lstrip('#'), 16) for color in colors]
+    recolorer = Recolorer(argv[1], colorkey=0x00FF00)
+    for path in recolorer.save_all(colors, argv[2]):
+        print(path)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv))
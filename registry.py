@@ -0,0 +1,96 @@
+"""Tracks every blood color that has been issued, shared between processes.
+
+The whole 24-bit rgb space is kept as a 2 MB bitset in a memory-mapped file.
+Claiming a color locks only the byte holding its bit, so concurrent writers
+in other processes only contend when they claim neighbouring colors.
+"""
+
+import os
+import mmap
+import threading
+from contextlib import contextmanager
+
+try:
+    import fcntl
+except ImportError:
+    # Windows has byte-range locks through msvcrt instead.
+    fcntl = None
+    import msvcrt
+
+import numpy as np
+import pygame as pg
+
+# One bit for each 0xRRGGBB color.
+SIZE = (1 << 24) // 8
+
+
+class IssuanceRegistry:
+    """Memory-mapped bitset of issued colors."""
+
+    def __init__(self, path):
+        self.path = path
+        self.fd = os.open(path, os.O_RDWR | os.O_CREAT | getattr(os, 'O_BINARY', 0))
+        if os.fstat(self.fd).st_size < SIZE:
+            os.ftruncate(self.fd, SIZE)
+        self.data = mmap.mmap(self.fd, SIZE)
+        # File locks are held per process, so threads need their own lock.
+        self.lock = threading.Lock()
+
+    @staticmethod
+    def _index(color):
+        """Return the bit index of a color, rgb tuple or hexcolor."""
+        if isinstance(color, (pg.Color, tuple)):
+            r, g, b = color[:3]
+            return (r*256 + g)*256 + b
+        return int(color) & 0xFFFFFF
+
+    @contextmanager
+    def _locked(self, offset):
+        """Hold an exclusive lock on one byte of the bitset."""
+        with self.lock:
+            if fcntl:
+                fcntl.lockf(self.fd, fcntl.LOCK_EX, 1, offset)
+                try:
+                    yield
+                finally:
+                    fcntl.lockf(self.fd, fcntl.LOCK_UN, 1, offset)
+            else:
+                os.lseek(self.fd, offset, os.SEEK_SET)
+                msvcrt.locking(self.fd, msvcrt.LK_LOCK, 1)
+                try:
+                    yield
+                finally:
+                    os.lseek(self.fd, offset, os.SEEK_SET)
+                    msvcrt.locking(self.fd, msvcrt.LK_UNLCK, 1)
+
+    def __contains__(self, color):
+        idx = self._index(color)
+        return bool(self.data[idx >> 3] >> (idx & 7) & 1)
+
+    def __len__(self):
+        """Number of issued colors. This scans the whole bitset."""
+        return bin(int.from_bytes(self.data, 'little')).count('1')
+
+    def claim(self, color):
+        """Mark a color as issued. Returns False if it already was."""
+        idx = self._index(color)
+        offset, bit = idx >> 3, 1 << (idx & 7)
+        with self._locked(offset):
+            byte = self.data[offset]
+            if byte & bit:
+                return False
+            self.data[offset] = byte | bit
+        return True
+
+    def unissued(self, codes):
+        """Return the given 0xRRGGBB colors that have not been issued yet."""
+        codes = np.asarray(codes, dtype=np.int64)
+        bits = np.frombuffer(self.data, np.uint8)[codes >> 3] >> (codes & 7) & 1
+        return codes[bits == 0]
+
+    def flush(self):
+        self.data.flush()
+
+    def close(self):
+        self.data.close()
+        os.close(self.fd)
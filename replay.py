@@ -0,0 +1,176 @@
+#!/usr/bin/env python
+"""Records input sessions and replays them headless to measure render throughput.
+
+usage:
+    replay.py record FILE             Run the picker, saving its input to FILE.
+    replay.py synth FILE [CLICKS]     Write a synthetic session of random clicks.
+    replay.py replay FILE [--hash]    Replay FILE as fast as possible and time it.
+
+Sessions are stored one frame per line, each a json list of input events.
+With --hash, a digest of every rendered frame is kept in FILE.hashes; if that
+file already exists the replay is checked against it instead.
+"""
+
+import os
+import sys
+import json
+import time
+import random
+import hashlib
+
+import pygame as pg
+
+# Only input events are recorded, window and system events are regenerated.
+INPUT_EVENTS = (
+    pg.QUIT,
+    pg.KEYDOWN, pg.KEYUP,
+    pg.MOUSEMOTION, pg.MOUSEBUTTONDOWN, pg.MOUSEBUTTONUP, pg.MOUSEWHEEL,
+    )
+
+
+def dump_events(events):
+    """Serialize a frame's input events into a json line."""
+    return json.dumps([
+        [event.type, {
+            name: value for name, value in event.dict.items()
+            if isinstance(value, (int, float, str, tuple))
+            }]
+        for event in events if event.type in INPUT_EVENTS
+        ])
+
+
+def load_events(line):
+    """Deserialize a json line back into events."""
+    return [
+        pg.event.Event(kind, {
+            name: tuple(value) if isinstance(value, list) else value
+            for name, value in attrs.items()
+            })
+        for kind, attrs in json.loads(line)
+        ]
+
+
+def record(app, path):
+    """Run the application, writing each frame's input to path."""
+    state = app.state
+    run = state.run
+    with open(path, 'w') as file:
+        def recorded_run():
+            events = pg.event.get()
+            file.write(dump_events(events) + '\n')
+            # Put the events back for the state to handle as usual.
+            for event in events:
+                pg.event.post(event)
+            return run()
+        state.run = recorded_run
+        app.run()
+
+
+def synthesize(app, path, clicks=5000, seed=0):
+    """Write a session of random left clicks on the picker's buttons."""
+    rng = random.Random(seed)
+    colorset = app.state.colorset
+    # Copy buttons are left out since the clipboard is unavailable headless.
+    buttons = [
+        colorset.genbutton, colorset.genallbutton,
+        colorset.mutantbutton, colorset.randombutton,
+        *colorset.castebuttons, *colorset.oldcolors,
+        ]
+    with open(path, 'w') as file:
+        for _ in range(clicks):
+            rect = rng.choice(buttons).rect
+            pos = (rng.randrange(rect.left, rect.right), rng.randrange(rect.top, rect.bottom))
+            for kind in (pg.MOUSEBUTTONDOWN, pg.MOUSEBUTTONUP):
+                file.write(dump_events([pg.event.Event(kind, button=1, pos=pos)]) + '\n')
+
+
+def replay(app, path, frame_hash=False):
+    """Feed a recorded session to the application state without frame limiting.
+
+    Returns the per-frame latencies in seconds and, if asked for, the digest
+    of every rendered frame.
+    """
+    from boilerplate import AppExit
+    state = app.state
+    surf = app.window.surf
+    times = []
+    digests = [] if frame_hash else None
+    with open(path) as file:
+        for line in file:
+            for event in load_events(line):
+                pg.event.post(event)
+            start = time.perf_counter()
+            try:
+                app.loop.run_until_complete(state.run())
+            except AppExit:
+                break
+            times.append(time.perf_counter() - start)
+            if digests is not None:
+                # Let bulk generation finish, so when its colors show up
+                # doesn't depend on thread timing.
+                job = state.colorset.job
+                if job is not None and job.running:
+                    app.loop.run_until_complete(job.future)
+                digests.append(hashlib.sha1(surf.get_buffer().raw).hexdigest())
+    return times, digests
+
+
+def report(times):
+    """Print throughput and latency figures for a replay."""
+    ordered = sorted(times)
+    total = sum(times)
+    print('frames:  {}'.format(len(times)))
+    print('elapsed: {:.2f} s'.format(total))
+    print('fps:     {:.1f}'.format(len(times) / total if total else 0.))
+    for name, frac in (('p50', 0.5), ('p95', 0.95), ('p99', 0.99), ('max', 1.)):
+        idx = min(int(frac * len(ordered)), len(ordered) - 1)
+        print('{}:     {:.3f} ms'.format(name, ordered[idx] * 1000))
+
+
+def check_hashes(digests, path):
+    """Compare frame digests to a saved set, or save them if there are none."""
+    if not os.path.exists(path):
+        with open(path, 'w') as file:
+            file.write('\n'.join(digests) + '\n')
+        print('saved {} frame hashes to {}'.format(len(digests), path))
+        return True
+    with open(path) as file:
+        expected = file.read().split()
+    for frame, (old, new) in enumerate(zip(expected, digests)):
+        if old != new:
+            print('frame {} differs from {}'.format(frame, path))
+            return False
+    if len(expected) != len(digests):
+        print('replayed {} frames, expected {}'.format(len(digests), len(expected)))
+        return False
+    print('all {} frames match {}'.format(len(digests), path))
+    return True
+
+
+def main(argv):
+    if len(argv) < 3 or argv[1] not in ('record', 'synth', 'replay'):
+        print(__doc__)
+        return 2
+    mode, path = argv[1:3]
+    if mode != 'record':
+        # Must be set before boilerplate initializes the display.
+        os.environ['SDL_VIDEODRIVER'] = 'dummy'
+    from hemopicker import make_app
+    # The picker seeds its generator from this, so frames are reproducible.
+    random.seed(0)
+    app = make_app()
+    if mode == 'record':
+        record(app, path)
+    elif mode == 'synth':
+        synthesize(app, path, *map(int, argv[3:4]))
+    else:
+        do_hash = '--hash' in argv[3:]
+        times, digests = replay(app, path, do_hash)
+        report(times)
+        if do_hash and not check_hashes(digests, path + '.hashes'):
+            return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv))
@@ -0,0 +1,193 @@
+"""Vectorized blood color generation over each caste's envelope.
+
+Quasi-random colors come from the Halton sequence, whose points are mapped
+through the inverse CDFs of the same distributions ColorSet draws from, so
+small palettes spread evenly over a caste's envelope instead of clustering.
+Every point is addressed by its index, so any index range can be generated
+on its own and ranges run in parallel. There are also pseudo-random draws
+for bulk generation, and an enumeration of every color an envelope holds.
+"""
+
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+from colorarray import to_rgb_array
+
+# Triangular (low, high, mode) envelopes of non-mutant blood colors.
+HUE_SPREAD = (0., 7.5, 0.)
+SAT_RANGE = (0.8, 1.0, 0.98)
+VAL_RANGE = (0.4, 0.8, 0.57)
+# One prime base per dimension: hue, sat, val, caste.
+BASES = (2, 3, 5, 7)
+# Slack for float error when testing colors against envelope bounds.
+EPSILON = 1e-9
+
+
+def radical_inverse(indices, base):
+    """Reflect the digits of each index in the given base about the radix point."""
+    indices = np.array(indices, dtype=np.int64)
+    result = np.zeros(indices.shape)
+    frac = 1. / base
+    while indices.any():
+        indices, digits = np.divmod(indices, base)
+        result += digits * frac
+        frac /= base
+    return result
+
+
+def halton(start, stop, dims=3):
+    """Return points start through stop of the Halton sequence as an (n, dims) array."""
+    # Index 0 is the origin in every base, so the sequence starts from 1.
+    indices = np.arange(start + 1, stop + 1)
+    return np.stack(
+        [radical_inverse(indices, base) for base in BASES[:dims]],
+        axis=-1,
+        )
+
+
+def triangular_ppf(u, low, high, mode):
+    """Inverse CDF of random.triangular, mapping uniform u onto its distribution."""
+    u = np.asarray(u)
+    split = (mode - low) / (high - low)
+    return np.where(
+        u < split,
+        low + np.sqrt(u * (high - low) * (mode - low)),
+        high - np.sqrt((1 - u) * (high - low) * (high - mode)),
+        )
+
+
+def quasi_hsv(hues, start, stop, caste=None, mutant=False):
+    """Generate colors start through stop as caste, hue, sat and val arrays.
+
+    The caste is drawn from the sequence as well if none is given.
+    """
+    points = halton(start, stop, 3 if caste is not None else 4)
+    if caste is not None:
+        castes = np.full(len(points), caste)
+    else:
+        castes = np.minimum((points[:, 3] * len(hues)).astype(np.intp), len(hues) - 1)
+    if not mutant:
+        hue = np.take(hues, castes) + triangular_ppf(points[:, 0], *HUE_SPREAD)
+        sat = triangular_ppf(points[:, 1], *SAT_RANGE)
+        val = triangular_ppf(points[:, 2], *VAL_RANGE)
+    else:
+        hue = (castes*30 + points[:, 0]*30 - 15) % 360
+        sat = points[:, 1]
+        val = points[:, 2]
+    return castes, hue, sat, val
+
+
+def random_hsv(rng, hues, count, caste=None, mutant=False):
+    """Draw count pseudo-random colors as caste, hue, sat and val arrays.
+
+    This is the vectorized equivalent of ColorSet's own random draws, using
+    a numpy Generator.
+    """
+    if caste is not None:
+        castes = np.full(count, caste)
+    else:
+        castes = rng.integers(len(hues), size=count)
+    if not mutant:
+        # numpy orders triangular arguments as low, mode, high.
+        hue = np.take(hues, castes) + rng.triangular(*HUE_SPREAD[::2], HUE_SPREAD[1], count)
+        sat = rng.triangular(*SAT_RANGE[::2], SAT_RANGE[1], count)
+        val = rng.triangular(*VAL_RANGE[::2], VAL_RANGE[1], count)
+    else:
+        hue = (castes*30 + rng.uniform(-15., 15., count)) % 360
+        sat = rng.random(count)
+        val = rng.random(count)
+    return castes, hue, sat, val
+
+
+def envelope_codes(hue_range, sat_range, val_range):
+    """Return every 0xRRGGBB color to_rgb makes from hsv within the ranges, sorted.
+
+    to_rgb rounds each channel, so this includes colors whose own hsv is just
+    outside the ranges. The hue range may wrap around 0. Rather than converting
+    all 2**24 colors, each one is built from its max and min channels and the
+    middle channel values its hue can round to, one sextant at a time.
+    """
+    lo, hi = hue_range
+    if hi - lo >= 360:
+        windows = [(0., 360.)]
+    else:
+        lo, hi = lo % 360, lo % 360 + (hi - lo)
+        windows = [(lo, min(hi, 360.))] + ([(0., hi - 360)] if hi > 360 else [])
+    sat_lo, sat_hi = sat_range
+    # Values and unrounded min channels that round to each max and min pair.
+    maxc, minc = np.mgrid[0:256, 0:256]
+    val_lo = np.maximum((maxc - 0.5) / 255, val_range[0])
+    val_hi = np.minimum((maxc + 0.5) / 255, val_range[1])
+    low_lo, low_hi = (minc - 0.5) / 255, (minc + 0.5) / 255
+    # The min channel is val * (1 - sat), which bounds val further.
+    with np.errstate(divide='ignore'):
+        val_lo = np.maximum(val_lo, low_lo / (1 - sat_lo))
+        val_hi = np.minimum(val_hi, low_hi / (1 - sat_hi))
+    # The middle channel grows with both val and the min channel, so its
+    # extremes come from the extremes of each.
+    low_min = np.maximum(low_lo, val_lo * (1 - sat_hi))
+    low_max = np.minimum(low_hi, val_hi * (1 - sat_lo))
+    keep = (minc <= maxc) & (val_lo < val_hi) & (low_min < low_max)
+    maxc, minc = maxc[keep], minc[keep]
+    val_lo, val_hi = val_lo[keep], val_hi[keep]
+    low_min, low_max = low_min[keep], low_max[keep]
+    parts = []
+    for sextant in range(6):
+        for a, b in windows:
+            a, b = max(a, sextant*60), min(b, sextant*60 + 60)
+            if a > b:
+                continue
+            a, b = (a - sextant*60) / 60, (b - sextant*60) / 60
+            if sextant % 2:
+                # The middle channel falls as hue rises in odd sextants.
+                a, b = 1 - b, 1 - a
+            mid_lo = (low_min + a*(val_lo - low_min)) * 255
+            mid_hi = (low_max + b*(val_hi - low_max)) * 255
+            low = np.maximum(np.ceil(mid_lo - 0.5 + EPSILON), minc).astype(np.int64)
+            high = np.minimum(np.floor(mid_hi + 0.5 - EPSILON), maxc).astype(np.int64)
+            counts = np.maximum(high - low + 1, 0)
+            starts = np.cumsum(counts) - counts
+            midc = np.repeat(low - starts, counts) + np.arange(counts.sum())
+            top, bottom = np.repeat(maxc, counts), np.repeat(minc, counts)
+            # Channel order for each sextant, as in colorarray.to_rgb_array.
+            r, g, b = (
+                (top, midc, bottom), (midc, top, bottom), (bottom, top, midc),
+                (bottom, midc, top), (midc, bottom, top), (top, bottom, midc),
+                )[sextant]
+            parts.append(r << 16 | g << 8 | b)
+    codes = np.sort(np.concatenate(parts)).astype(np.uint32)
+    # Colors on sextant boundaries are made twice.
+    return codes[np.concatenate([[True], codes[1:] != codes[:-1]])]
+
+
+def caste_envelope(hues, caste, mutant=False):
+    """Return every color that can be generated for a caste, sorted."""
+    if not mutant:
+        hue = hues[caste]
+        return envelope_codes(
+            (hue + HUE_SPREAD[0], hue + HUE_SPREAD[1]), SAT_RANGE[:2], VAL_RANGE[:2],
+            )
+    return envelope_codes((caste*30 - 15, caste*30 + 15), (0., 1.), (0., 1.))
+
+
+def quasi_rgb(hues, start, stop, caste=None, mutant=False):
+    """Generate colors start through stop as caste and (n, 3) rgb arrays."""
+    castes, hue, sat, val = quasi_hsv(hues, start, stop, caste, mutant)
+    return castes, to_rgb_array(hue, sat, val)
+
+
+def quasi_rgb_parallel(hues, start, stop, chunk=1 << 16, workers=None, **kwargs):
+    """Generate a large index range in independent chunks across threads."""
+    bounds = [(lo, min(lo + chunk, stop)) for lo in range(start, stop, chunk)]
+    with ThreadPoolExecutor(workers) as pool:
+        parts = list(pool.map(
+            lambda bound: quasi_rgb(hues, *bound, **kwargs),
+            bounds,
+            ))
+    if not parts:
+        return np.empty(0, np.intp), np.empty((0, 3), np.uint8)
+    return (
+        np.concatenate([castes for castes, _ in parts]),
+        np.concatenate([rgb for _, rgb in parts]),
+        )
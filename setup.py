@@ -1,11 +1,26 @@
 import sys
-from cx_Freeze import setup, Executable
+from cx_Freeze import setup, Executable, build_exe
 
-# Dependency list.
+from bundle import TEXTURES, pack
+
+
+class BuildExe(build_exe):
+    """Packs the textures the app uses into one pre-decoded file first.
+
+    The bdist commands run build_exe too, so they get a fresh bundle as well,
+    while commands that don't build never need a display.
+    """
+
+    def run(self):
+        pack("textures", "textures.bundle", TEXTURES)
+        super().run()
+
+
+# Dependency list. Only modules that are actually imported get frozen.
 build_exe_options = {
-    "packages": ["asyncio", "pygame"], 
-    "excludes": ["tkinter", "numpy"],
-    "include_files": ["textures"]
+    "packages": ["pygame"], 
+    "excludes": ["tkinter"],
+    "include_files": ["textures.bundle"]
 }
 # Base for GUI apps on Windows.
 base = "Win32GUI" if sys.platform == "win32" else None
@@ -18,5 +33,6 @@ setup(
     license = 'GPL',
     url = 'https://github.com/virtuNat/hemopicker',
     options = {"build_exe": build_exe_options},
+    cmdclass = {"build_exe": BuildExe},
     executables = [Executable('hemopicker.py', base=base)]
 )
@@ -0,0 +1,39 @@
+#!/usr/bin/env python
+"""Breaks the hemopicker's time to first frame down into its startup phases."""
+
+import time
+
+start = time.perf_counter()
+marks = []
+
+
+def mark(phase):
+    """Record the time elapsed since the previous mark under a phase name."""
+    marks.append((phase, time.perf_counter()))
+
+
+import pygame as pg
+mark('import')
+# Importing boilerplate initializes pygame and opens the loading window.
+import boilerplate
+mark('init')
+# The button sheet is loaded by colorset on import, the rest by ColorMenu.
+import colorset
+mark('asset load')
+from hemopicker import make_window, make_app
+mark('import')
+window = make_window()
+mark('init')
+app = make_app(window)
+mark('asset load')
+app.loop.run_until_complete(app.state.run())
+mark('first display')
+
+totals = {}
+last = start
+for phase, stamp in marks:
+    totals[phase] = totals.get(phase, 0.) + stamp - last
+    last = stamp
+for phase, total in totals.items():
+    print('{:<14}{:8.1f} ms'.format(phase, total * 1000))
+print('{:<14}{:8.1f} ms'.format('first frame', (last - start) * 1000))